@@ -6,6 +6,698 @@ import numpy as np
 from PIL import Image, ImageTk
 from datetime import datetime
 import pickle
+import argparse
+import json
+import os
+import struct
+import queue
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+
+def charger_galerie(cursor):
+    """Lit les visages enregistrés et retourne (visages, labels, person_mapping)"""
+    cursor.execute('SELECT id, matricule, nom, prenom, face_data FROM personnes')
+    rows = cursor.fetchall()
+    
+    faces = []
+    labels = []
+    person_mapping = {}
+    
+    for row in rows:
+        person_id, matricule, nom, prenom, face_blob = row
+        face_data = pickle.loads(face_blob)
+        
+        faces.append(face_data)
+        labels.append(person_id)
+        
+        person_mapping[person_id] = {
+            'matricule': matricule,
+            'nom': nom,
+            'prenom': prenom
+        }
+    
+    return faces, labels, person_mapping
+
+
+def lire_data_version(cursor):
+    """Compteur SQLite incrémenté à chaque modification faite par une autre connexion"""
+    cursor.execute('PRAGMA data_version')
+    return cursor.fetchone()[0]
+
+
+def fusionner_detections(faces, seuil_iou=0.3):
+    """Supprime les détections en double (zones qui se chevauchent)
+    
+    Les rectangles sont parcourus du plus grand au plus petit ; un rectangle est
+    écarté s'il recouvre un rectangle déjà retenu au-delà de seuil_iou.
+    """
+    retenus = []
+    for (x, y, w, h) in sorted(faces, key=lambda f: f[2] * f[3], reverse=True):
+        doublon = False
+        for (rx, ry, rw, rh) in retenus:
+            inter_w = min(x + w, rx + rw) - max(x, rx)
+            inter_h = min(y + h, ry + rh) - max(y, ry)
+            if inter_w > 0 and inter_h > 0:
+                intersection = inter_w * inter_h
+                if intersection / (w * h + rw * rh - intersection) > seuil_iou:
+                    doublon = True
+                    break
+        if not doublon:
+            retenus.append((x, y, w, h))
+    return retenus
+
+
+def entrainer_modele(faces, labels):
+    """Entraîne un nouveau recognizer LBPH, ou retourne None en cas d'échec"""
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    try:
+        recognizer.train(faces, np.array(labels))
+        return recognizer
+    except Exception as e:
+        print(f"✗ Erreur lors de l'entraînement: {e}")
+        return None
+
+
+def construire_modele(faces, labels):
+    """Entraîne le modèle adapté à la taille de la galerie
+    
+    Retourne (recognizer, index) : un recognizer LBPH pour les petites
+    galeries, un IndexCandidats seul à partir de IndexCandidats.SEUIL visages
+    (le recognizer est alors abandonné pour ne garder qu'une copie des
+    histogrammes). Les deux valent None si la galerie est vide ou en cas d'échec.
+    """
+    if not faces:
+        return None, None
+    if len(faces) < IndexCandidats.SEUIL:
+        return entrainer_modele(faces, labels), None
+    
+    try:
+        return None, IndexCandidats.depuis_visages(faces, labels)
+    except Exception as e:
+        print(f"✗ Erreur lors de la construction de l'index: {e}")
+        return None, None
+
+
+def reconstruire_modele(db_path, resultats, etiquette=None):
+    """Relit la base sur une connexion dédiée et entraîne un nouveau modèle
+    
+    Prévu pour un thread d'arrière-plan : un résultat est toujours déposé dans
+    la file resultats, avec 'erreur' renseigné si la reconstruction a échoué
+    (base verrouillée, visage illisible...) pour que l'appelant réessaie.
+    """
+    resultat = {'etiquette': etiquette, 'recognizer': None, 'index': None,
+                'person_mapping': None, 'nb_visages': 0, 'erreur': None}
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            faces, labels, person_mapping = charger_galerie(conn.cursor())
+        finally:
+            conn.close()
+        
+        recognizer, index = construire_modele(faces, labels)
+        if faces and recognizer is None and index is None:
+            raise RuntimeError("échec de l'entraînement")
+        
+        resultat.update(recognizer=recognizer, index=index,
+                        person_mapping=person_mapping, nb_visages=len(faces))
+    except Exception as e:
+        resultat['erreur'] = str(e)
+    finally:
+        resultats.put(resultat)
+
+
+def histogramme_lbph(face, rayon=1, voisins=8, grille=(8, 8)):
+    """Calcule l'histogramme LBPH d'un visage comme cv2.face.LBPHFaceRecognizer
+    
+    Motifs binaires locaux circulaires (interpolation bilinéaire), puis
+    histogrammes normalisés de chaque cellule de la grille, concaténés.
+    """
+    src = face.astype(np.float32)
+    h, w = src.shape
+    centre = src[rayon:h-rayon, rayon:w-rayon]
+    codes = np.zeros(centre.shape, dtype=np.int64)
+    eps = np.finfo(np.float32).eps
+    
+    def decaler(dy, dx):
+        return src[rayon+dy:h-rayon+dy, rayon+dx:w-rayon+dx]
+    
+    for n in range(voisins):
+        x = np.float32(rayon * np.cos(2.0 * np.pi * n / voisins))
+        y = np.float32(-rayon * np.sin(2.0 * np.pi * n / voisins))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = x - fx, y - fy
+        
+        t = ((1 - tx) * (1 - ty) * decaler(fy, fx) + tx * (1 - ty) * decaler(fy, cx) +
+             (1 - tx) * ty * decaler(cy, fx) + tx * ty * decaler(cy, cx))
+        codes += ((t > centre) | (np.abs(t - centre) < eps)).astype(np.int64) << n
+    
+    # Une ligne par cellule de la grille, parcourue ligne par ligne
+    grille_x, grille_y = grille
+    cellule_h, cellule_w = codes.shape[0] // grille_y, codes.shape[1] // grille_x
+    cellules = codes[:grille_y * cellule_h, :grille_x * cellule_w]
+    cellules = cellules.reshape(grille_y, cellule_h, grille_x, cellule_w).transpose(0, 2, 1, 3)
+    cellules = cellules.reshape(grille_y * grille_x, -1)
+    
+    nb_motifs = 2 ** voisins
+    decalages = np.arange(len(cellules))[:, None] * nb_motifs
+    histogramme = np.bincount((cellules + decalages).ravel(), minlength=len(cellules) * nb_motifs)
+    return (histogramme / cellules.shape[1]).astype(np.float32)
+
+
+def calculer_racines(faces, sortie, taille_bloc=1000):
+    """Écrit dans sortie la racine carrée des histogrammes LBPH des visages
+    
+    Un recognizer temporaire est entraîné bloc par bloc : seuls les histogrammes
+    d'un bloc existent en double à un instant donné.
+    """
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    for debut in range(0, len(faces), taille_bloc):
+        bloc = faces[debut:debut + taille_bloc]
+        recognizer.train(bloc, np.zeros(len(bloc), dtype=np.int32))
+        for i, histogramme in enumerate(recognizer.getHistograms()):
+            np.sqrt(histogramme.ravel(), out=sortie[debut + i])
+
+
+class IndexCandidats:
+    """Recherche en deux étapes pour les grandes galeries
+    
+    1) La racine des histogrammes LBPH est projetée par PCA (la distance
+       euclidienne y approche celle du khi-deux) et les N plus proches voisins
+       forment une liste restreinte de candidats.
+    2) La distance LBPH exacte (khi-deux) n'est calculée que sur cette liste.
+    
+    Seule la racine des histogrammes est conservée, en une seule copie qui peut
+    être projetée en mémoire ; l'étape 2 remet au carré les lignes candidates.
+    Avec taille_liste=None (ou une galerie plus petite que la liste), la
+    recherche est exhaustive : l'étape 2 parcourt alors la galerie par petites
+    tranches contiguës, sans copie des lignes.
+    """
+    SEUIL = 2000
+    DIMENSION = 8 * 8 * 256
+    BLOC = 1024
+    BLOC_KHI2 = 16
+    
+    def __init__(self, racines, labels, dimensions=64, taille_liste=50, echantillon=1000):
+        self.racines = racines
+        self.labels = np.asarray(labels).ravel()
+        n = len(self.labels)
+        
+        if taille_liste is None or taille_liste >= n:
+            self.taille_liste = None
+            self.projections = None
+            return
+        self.taille_liste = taille_liste
+        
+        # Apprendre la projection sur un échantillon pour borner le coût
+        if n > echantillon:
+            indices = np.sort(np.random.default_rng(0).choice(n, echantillon, replace=False))
+        else:
+            indices = np.arange(n)
+        donnees_pca = np.asarray(racines[indices])
+        self.moyenne = donnees_pca.mean(axis=0)
+        _, _, vecteurs = np.linalg.svd(donnees_pca - self.moyenne, full_matrices=False)
+        self.vecteurs = np.ascontiguousarray(vecteurs[:dimensions].T)
+        
+        # Projeter par blocs pour ne pas dupliquer la galerie
+        self.projections = np.empty((n, self.vecteurs.shape[1]), dtype=np.float32)
+        for debut in range(0, n, self.BLOC):
+            bloc = np.asarray(racines[debut:debut + self.BLOC])
+            self.projections[debut:debut + self.BLOC] = (bloc - self.moyenne) @ self.vecteurs
+        
+    @classmethod
+    def depuis_visages(cls, faces, labels, **params):
+        """Calcule les histogrammes des visages puis construit l'index"""
+        racines = np.empty((len(faces), cls.DIMENSION), dtype=np.float32)
+        calculer_racines(faces, racines)
+        return cls(racines, labels, **params)
+        
+    def predict(self, face):
+        """Même interface que LBPHFaceRecognizer.predict : (label, distance)"""
+        sonde = histogramme_lbph(face)
+        
+        if self.projections is None:
+            # Recherche exhaustive : tranches contiguës (vues sans copie)
+            khi2 = np.concatenate([self.distances_khi2(sonde, self.racines[debut:debut + self.BLOC_KHI2])
+                                   for debut in range(0, len(self.labels), self.BLOC_KHI2)])
+            meilleur = int(np.argmin(khi2))
+            return int(self.labels[meilleur]), float(khi2[meilleur])
+        
+        # Étape 2 : distance du khi-deux (HISTCMP_CHISQR_ALT) sur les seuls candidats
+        candidats = self.candidats(sonde, self.taille_liste)
+        khi2 = self.distances_khi2(sonde, self.racines[candidats])
+        
+        meilleur = int(np.argmin(khi2))
+        return int(self.labels[candidats[meilleur]]), float(khi2[meilleur])
+        
+    def candidats(self, sonde, taille_liste):
+        """Étape 1 : indices (triés) des taille_liste lignes les plus proches dans l'espace réduit"""
+        projection = (np.sqrt(sonde) - self.moyenne) @ self.vecteurs
+        distances = ((self.projections - projection) ** 2).sum(axis=1)
+        return np.sort(np.argpartition(distances, taille_liste - 1)[:taille_liste])
+        
+    def distances_khi2(self, sonde, racines):
+        """Distance du khi-deux entre la sonde et quelques lignes de racines
+        
+        Deux tableaux temporaires de la taille du bloc seulement.
+        """
+        # Un plancher infime sur la sonde évite la division par zéro sans
+        # changer le résultat (là où la somme serait nulle, l'écart l'est aussi)
+        sonde = sonde + np.float32(1e-30)
+        hist = np.square(racines)
+        somme = hist + sonde
+        hist -= sonde
+        np.square(hist, out=hist)
+        hist /= somme
+        return 2 * hist.sum(axis=1)
+
+
+def benchmark_liste(db_path='face_recognition.db', taille_galerie=None, nb_requetes=100,
+                    tailles_liste=(10, 25, 50, 100)):
+    """Mesure si l'étape 1 conserve le gagnant de la recherche exhaustive
+    
+    Pour chaque taille de liste N, on compte la part des requêtes dont le
+    visage retenu par la recherche LBPH exhaustive figure parmi les N
+    candidats de l'étape 1, ainsi que les latences. La galerie de la base est
+    complétée jusqu'à taille_galerie par des variantes augmentées de ses vrais
+    visages (rotation, échelle, décalage, miroir, luminosité, bruit) ; les
+    requêtes sont d'autres variantes des visages de la galerie.
+    """
+    # Ne pas créer de base vide par erreur
+    if not os.path.exists(db_path):
+        print(f"✗ Base introuvable : {db_path}")
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        faces, labels, _ = charger_galerie(conn.cursor())
+    except sqlite3.OperationalError:
+        faces, labels = [], []
+    conn.close()
+    
+    if not faces:
+        print("✗ Aucun visage dans la base : enregistrez des personnes avant de lancer le benchmark")
+        return
+    if len(set(labels)) < 5:
+        print(f"⚠ Seulement {len(set(labels))} personne(s) dans la base : "
+              "les résultats ne sont qu'indicatifs")
+    
+    rng = np.random.default_rng(0)
+    
+    def augmenter(face):
+        h, w = face.shape
+        matrice = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-8, 8), rng.uniform(0.92, 1.08))
+        matrice[:, 2] += rng.integers(-4, 5, 2)
+        variante = cv2.warpAffine(face, matrice, (w, h), borderMode=cv2.BORDER_REFLECT)
+        if rng.random() < 0.5:
+            variante = cv2.flip(variante, 1)
+        variante = (variante.astype(np.float32) * rng.uniform(0.8, 1.2) + rng.uniform(-15, 15)
+                    + rng.normal(0, 3, face.shape))
+        return np.clip(variante, 0, 255).astype(np.uint8)
+    
+    # Chaque ligne est son propre label pour retrouver le gagnant exact ;
+    # personnes[] garde l'identité réelle d'origine
+    galerie, personnes = list(faces), list(labels)
+    while len(galerie) < (taille_galerie or len(faces)):
+        source = rng.integers(len(faces))
+        galerie.append(augmenter(faces[source]))
+        personnes.append(labels[source])
+    personnes = np.array(personnes)
+    
+    tailles_liste = sorted(t for t in tailles_liste if t < len(galerie))
+    if not tailles_liste:
+        print(f"✗ Galerie trop petite ({len(galerie)} visage(s)) : utilisez --taille-galerie")
+        return
+    
+    recognizer = entrainer_modele(galerie, np.arange(len(galerie)))
+    debut = time.perf_counter()
+    index = IndexCandidats.depuis_visages(galerie, np.arange(len(galerie)), taille_liste=tailles_liste[-1])
+    duree_index = time.perf_counter() - debut
+    
+    cibles = rng.choice(len(galerie), nb_requetes)
+    requetes = [augmenter(galerie[i]) for i in cibles]
+    
+    def mesurer(predire):
+        resultats, latences = [], []
+        for requete in requetes:
+            debut = time.perf_counter()
+            resultats.append(predire(requete)[0])
+            latences.append(time.perf_counter() - debut)
+        latences.sort()
+        return np.array(resultats), latences
+    
+    def resume(latences):
+        return f"moyenne {np.mean(latences) * 1000:.2f} ms, p95 {latences[int(len(latences) * 0.95) - 1] * 1000:.2f} ms"
+    
+    gagnants, latences_exhaustif = mesurer(recognizer.predict)
+    sondes = [histogramme_lbph(requete) for requete in requetes]
+    
+    print(f"Galerie: {len(galerie)} visage(s) dont {len(faces)} réel(s), {nb_requetes} requête(s)")
+    print(f"Construction de l'index: {duree_index:.2f} s")
+    print(f"LBPH exhaustif : {resume(latences_exhaustif)}, "
+          f"bonne personne {np.mean(personnes[gagnants] == personnes[cibles]) * 100:.1f}%")
+    for taille_liste in tailles_liste:
+        presents = np.mean([gagnant in index.candidats(sonde, taille_liste)
+                            for gagnant, sonde in zip(gagnants, sondes)])
+        index.taille_liste = taille_liste
+        resultats, latences = mesurer(index.predict)
+        print(f"Liste de {taille_liste:>3} : gagnant exhaustif présent {presents * 100:.1f}%, "
+              f"même résultat {np.mean(resultats == gagnants) * 100:.1f}%, {resume(latences)}, "
+              f"x{np.mean(latences_exhaustif) / np.mean(latences):.1f}")
+
+
+class GaleriePartagee:
+    """Galerie de référence publiée dans un fichier projeté en mémoire
+    
+    Le fichier contient les histogrammes LBPH déjà calculés (leur racine
+    carrée, la forme utilisée par IndexCandidats) : chaque processus s'y
+    attache en lecture seule et compare les visages directement aux lignes
+    projetées, sans copie, sans désérialisation ni entraînement.
+    
+    Chaque publication écrit un nouveau fichier « chemin.<version> » ; le
+    fichier « chemin » lui-même n'est qu'un petit pointeur (signature et
+    version), remplacé atomiquement et jamais projeté. Un fichier de données
+    n'est donc jamais écrasé pendant qu'il est projeté (ce que Windows refuse),
+    et les anciennes versions sont supprimées dès qu'elles ne sont plus utilisées.
+    
+    Format des données : en-tête (signature, version, nombre, dimension,
+    taille des métadonnées), labels int32, person_mapping en JSON, puis les
+    histogrammes float32 alignés sur 64 octets.
+    """
+    SIGNATURE = b'GALFACE2'
+    ENTETE = struct.Struct('<8sQQIQ')
+    TAILLE_ENTETE = 64
+    SIGNATURE_POINTEUR = b'GALPTR01'
+    POINTEUR = struct.Struct('<8sQ')
+    
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.version = None
+        self.attacher()
+        
+    @classmethod
+    def publier(cls, chemin, faces, labels, person_mapping):
+        """Calcule les histogrammes dans un nouveau fichier versionné puis y fait pointer chemin"""
+        n = len(faces)
+        dimension = IndexCandidats.DIMENSION
+        metadonnees = json.dumps({str(k): v for k, v in person_mapping.items()},
+                                 ensure_ascii=False).encode('utf-8')
+        offset_racines = cls.offset_racines(n, len(metadonnees))
+        
+        # Création exclusive : deux publications simultanées ne partagent jamais un fichier
+        while True:
+            version = time.time_ns()
+            fichier = cls.fichier_version(chemin, version)
+            try:
+                f = open(fichier, 'xb')
+                break
+            except FileExistsError:
+                continue
+        
+        with f:
+            entete = cls.ENTETE.pack(cls.SIGNATURE, version, n, dimension, len(metadonnees))
+            f.write(entete.ljust(cls.TAILLE_ENTETE, b'\0'))
+            f.write(np.asarray(labels, dtype=np.int32).tobytes())
+            f.write(metadonnees)
+            f.truncate(offset_racines + n * dimension * 4)
+        
+        # Les histogrammes sont écrits par blocs directement dans le fichier
+        if n:
+            racines = np.memmap(fichier, dtype=np.float32, mode='r+', offset=offset_racines,
+                                shape=(n, dimension))
+            calculer_racines(faces, racines)
+            racines.flush()
+            del racines
+        
+        cls.ecrire_pointeur(chemin, version)
+        cls.nettoyer(chemin)
+        print(f"✓ Galerie publiée ({n} visage(s), version {version})")
+        return version
+        
+    @classmethod
+    def fichier_version(cls, chemin, version):
+        """Nom du fichier de données d'une version"""
+        return f"{chemin}.{version}"
+        
+    @classmethod
+    def ecrire_pointeur(cls, chemin, version):
+        """Fait pointer chemin vers version, sauf si une version plus récente est déjà publiée"""
+        temp_path = f"{chemin}.{version}.ptr"
+        with open(temp_path, 'wb') as f:
+            f.write(cls.POINTEUR.pack(cls.SIGNATURE_POINTEUR, version))
+        
+        for _ in range(10):
+            try:
+                if cls.lire_pointeur(chemin) > version:
+                    os.remove(temp_path)
+                    return
+            except (OSError, ValueError, struct.error):
+                pass
+            try:
+                os.replace(temp_path, chemin)
+                return
+            except PermissionError:
+                # Windows : un lecteur a le pointeur ouvert à cet instant
+                time.sleep(0.05)
+        os.replace(temp_path, chemin)
+        
+    @classmethod
+    def lire_pointeur(cls, chemin):
+        """Version actuellement publiée, lue dans le fichier pointeur"""
+        with open(chemin, 'rb') as f:
+            signature, version = cls.POINTEUR.unpack(f.read(cls.POINTEUR.size))
+        if signature != cls.SIGNATURE_POINTEUR:
+            raise ValueError("Fichier de galerie invalide")
+        return version
+        
+    @classmethod
+    def nettoyer(cls, chemin):
+        """Supprime les versions antérieures à la version publiée
+        
+        Sous Windows, une version encore projetée par un processus ne peut pas
+        être supprimée : elle le sera lors d'un prochain nettoyage.
+        """
+        try:
+            courante = cls.lire_pointeur(chemin)
+        except (OSError, ValueError, struct.error):
+            return
+        dossier, prefixe = os.path.split(os.path.abspath(chemin))
+        for nom in os.listdir(dossier):
+            suffixe = nom[len(prefixe) + 1:]
+            if nom.startswith(prefixe + '.') and suffixe.isdigit() and int(suffixe) < courante:
+                try:
+                    os.remove(os.path.join(dossier, nom))
+                except OSError:
+                    pass
+        
+    @classmethod
+    def offset_racines(cls, n, taille_meta):
+        """Position des histogrammes dans le fichier, alignée sur 64 octets"""
+        fin_meta = cls.TAILLE_ENTETE + 4 * n + taille_meta
+        return (fin_meta + 63) // 64 * 64
+        
+    @classmethod
+    def lire_entete(cls, source):
+        """Décode l'en-tête et vérifie la signature"""
+        signature, version, n, dimension, taille_meta = cls.ENTETE.unpack_from(source, 0)
+        if signature != cls.SIGNATURE:
+            raise ValueError("Fichier de galerie invalide")
+        return version, n, dimension, taille_meta
+        
+    def attacher(self):
+        """Projette la version publiée (lecture seule) et expose ses tableaux"""
+        version_publiee = self.lire_pointeur(self.chemin)
+        data = np.memmap(self.fichier_version(self.chemin, version_publiee), dtype=np.uint8, mode='r')
+        version, n, dimension, taille_meta = self.lire_entete(data)
+        if version != version_publiee:
+            raise ValueError("Version de galerie incohérente")
+        
+        offset_meta = self.TAILLE_ENTETE + 4 * n
+        self.labels = np.ndarray((n,), dtype=np.int32, buffer=data, offset=self.TAILLE_ENTETE)
+        metadonnees = json.loads(bytes(data[offset_meta:offset_meta + taille_meta]).decode('utf-8'))
+        self.person_mapping = {int(k): v for k, v in metadonnees.items()}
+        self.racines = np.ndarray((n, dimension), dtype=np.float32, buffer=data,
+                                  offset=self.offset_racines(n, taille_meta))
+        
+        self.data = data
+        self.version = version
+        
+    def construire_index(self):
+        """Index de recherche sur les histogrammes projetés
+        
+        La liste de candidats sert dès que la galerie la dépasse : la recherche
+        exhaustive en numpy est bien plus lente que LBPH predict.
+        """
+        if len(self.labels) == 0:
+            return None
+        return IndexCandidats(self.racines, self.labels)
+        
+    def version_disque(self):
+        """Lit la version actuellement publiée sans projeter de fichier"""
+        return self.lire_pointeur(self.chemin)
+        
+    def a_change(self):
+        """Indique si une nouvelle version a été publiée depuis l'attachement"""
+        try:
+            return self.version_disque() != self.version
+        except (OSError, ValueError, struct.error):
+            return False
+
+
+def rattacher_galerie(chemin, resultats):
+    """Projette la dernière version de la galerie et construit son index
+    
+    Prévu pour un thread d'arrière-plan, comme reconstruire_modele : un
+    résultat est toujours déposé dans resultats.
+    """
+    resultat = {'etiquette': None, 'recognizer': None, 'index': None,
+                'person_mapping': None, 'nb_visages': 0, 'erreur': None}
+    try:
+        galerie = GaleriePartagee(chemin)
+        resultat.update(galerie=galerie, index=galerie.construire_index(),
+                        person_mapping=galerie.person_mapping, nb_visages=len(galerie.labels))
+    except Exception as e:
+        resultat['erreur'] = str(e)
+    finally:
+        resultats.put(resultat)
+
+
+class ModeleReconnaissance:
+    """Modèle de reconnaissance en mémoire, commun à l'interface et au service
+    
+    Regroupe le recognizer LBPH (petites galeries), l'index de candidats
+    (grandes galeries ou galerie partagée) et la correspondance label ->
+    personne, ainsi que leurs mises à jour quand la base change.
+    """
+    def __init__(self):
+        self.recognizer = None
+        self.index = None
+        self.person_mapping = {}
+        
+    @property
+    def entraine(self):
+        """Vrai si au moins un visage est connu du modèle"""
+        return self.recognizer is not None or self.index is not None
+        
+    def charger(self, cursor):
+        """Charge tous les visages de la base, entraîne le modèle et retourne leur nombre"""
+        faces, labels, person_mapping = charger_galerie(cursor)
+        self.recognizer, self.index = construire_modele(faces, labels)
+        self.person_mapping = person_mapping
+        return len(faces)
+        
+    def attacher_galerie(self, galerie):
+        """Utilise directement les histogrammes d'une galerie partagée, sans entraînement"""
+        self.recognizer = None
+        self.index = galerie.construire_index()
+        self.person_mapping = galerie.person_mapping
+        
+    def appliquer(self, resultat):
+        """Met en place un modèle construit en arrière-plan (reconstruire_modele, rattacher_galerie)"""
+        self.recognizer = resultat['recognizer']
+        self.index = resultat['index']
+        self.person_mapping = resultat['person_mapping']
+        
+    def mettre_a_jour(self, cursor):
+        """Applique les modifications de la base sans réentraînement quand c'est possible
+        
+        Les changements d'informations seules ne touchent que person_mapping et
+        quelques ajouts sont appris par update(). Retourne False quand une
+        reconstruction complète est nécessaire (suppressions, nombreux ajouts,
+        grande galerie, échec de la mise à jour).
+        """
+        cursor.execute('SELECT id, matricule, nom, prenom FROM personnes')
+        person_mapping = {
+            person_id: {'matricule': matricule, 'nom': nom, 'prenom': prenom}
+            for person_id, matricule, nom, prenom in cursor.fetchall()
+        }
+        
+        anciens = set(self.person_mapping)
+        ajouts = set(person_mapping) - anciens
+        suppressions = anciens - set(person_mapping)
+        
+        if not ajouts and not suppressions:
+            # Seules les informations ont changé : pas de réentraînement
+            self.person_mapping = person_mapping
+            return True
+        
+        if (not suppressions and self.recognizer is not None and len(ajouts) <= 50
+                and len(person_mapping) < IndexCandidats.SEUIL):
+            # Quelques ajouts : mise à jour incrémentale du modèle
+            cursor.execute('SELECT id, face_data FROM personnes WHERE id > ?', (max(anciens),))
+            rows = [row for row in cursor.fetchall() if row[0] in ajouts]
+            if len(rows) == len(ajouts):
+                try:
+                    self.recognizer.update([pickle.loads(blob) for _, blob in rows],
+                                           np.array([person_id for person_id, _ in rows]))
+                    self.person_mapping = person_mapping
+                    print(f"✓ Modèle mis à jour avec {len(rows)} nouveau(x) visage(s)")
+                    return True
+                except Exception as e:
+                    print(f"✗ Erreur lors de la mise à jour: {e}")
+        
+        return False
+        
+    def predire(self, face):
+        """Identifie un visage, via la liste de candidats pour les grandes galeries"""
+        if self.index is not None:
+            return self.index.predict(face)
+        if self.recognizer is not None:
+            return self.recognizer.predict(face)
+        return -1, float('inf')
+
+
+class DetecteurMouvement:
+    """Détecte le mouvement par différence d'images sur une vignette réduite
+    
+    Sert à suspendre la détection de visages quand la scène est immobile et à
+    espacer progressivement les lectures de la caméra.
+    """
+    def __init__(self, seuil_pixel=25, proportion_min=0.01, maintien=2.0,
+                 delai_actif=30, delai_max=500):
+        self.seuil_pixel = seuil_pixel
+        self.proportion_min = proportion_min
+        self.maintien = maintien
+        self.delai_actif = delai_actif
+        self.delai_max = delai_max
+        
+        self.precedente = None
+        self.derniere_activite = time.monotonic()
+        self.delai = delai_actif
+        
+    def analyser(self, frame):
+        """Compare l'image à la précédente et indique si la scène est active"""
+        vignette = cv2.resize(frame, (80, 60), interpolation=cv2.INTER_AREA)
+        vignette = cv2.cvtColor(vignette, cv2.COLOR_BGR2GRAY)
+        vignette = cv2.GaussianBlur(vignette, (5, 5), 0)
+        
+        if self.precedente is not None:
+            diff = cv2.absdiff(vignette, self.precedente)
+            if np.count_nonzero(diff > self.seuil_pixel) > self.proportion_min * diff.size:
+                self.signaler_activite()
+        self.precedente = vignette
+        
+        return self.est_actif()
+        
+    def signaler_activite(self):
+        """Marque la scène comme active (mouvement ou visage présent)"""
+        self.derniere_activite = time.monotonic()
+        self.delai = self.delai_actif
+        
+    def est_actif(self):
+        return time.monotonic() - self.derniere_activite < self.maintien
+        
+    def prochain_delai(self):
+        """Délai avant la prochaine image : doublé à chaque image immobile, plafonné"""
+        if self.est_actif():
+            self.delai = self.delai_actif
+        else:
+            self.delai = min(self.delai * 2, self.delai_max)
+        return self.delai
+
 
 class FaceRecognitionApp:
     def __init__(self, root):
@@ -16,22 +708,31 @@ class FaceRecognitionApp:
         # Charger le modèle de détection de visages
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         
-        # Initialiser le recognizer LBPH
-        self.face_recognizer = cv2.face.LBPHFaceRecognizer_create()
-        self.recognizer_trained = False
+        # Modèle de reconnaissance (recognizer LBPH ou index de candidats)
+        self.modele = ModeleReconnaissance()
         
         # Initialisation de la base de données
         self.init_database()
+        self.charger_zones()
         
         # Variables
         self.current_image_path = None
         self.current_frame = None
         self.camera = None
+        self.camera_index = None
         self.is_camera_on = False
         
+        # Rechargement du modèle quand la base est modifiée par un autre poste
+        self.generation_modele = 0
+        self.generation_lancee = None
+        self.rechargement_en_cours = False
+        self.modeles_reconstruits = queue.Queue()
+        
         # Création de l'interface
         self.create_widgets()
-        self.load_known_faces()
+        self.load_known_faces(arriere_plan=False)
+        self.data_version = lire_data_version(self.cursor)
+        self.surveiller_base()
         
     def init_database(self):
         """Initialise la base de données si elle n'existe pas"""
@@ -50,8 +751,67 @@ class FaceRecognitionApp:
                 face_data BLOB NOT NULL
             )
         ''')
+        
+        # Zones de détection par caméra (coordonnées relatives, tailles en pixels)
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS zones_detection (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                x REAL NOT NULL,
+                y REAL NOT NULL,
+                largeur REAL NOT NULL,
+                hauteur REAL NOT NULL,
+                taille_min INTEGER,
+                taille_max INTEGER
+            )
+        ''')
         self.conn.commit()
         
+    def charger_zones(self):
+        """Charge les zones de détection de chaque caméra"""
+        self.cursor.execute('SELECT source, x, y, largeur, hauteur, taille_min, taille_max FROM zones_detection')
+        self.zones = {}
+        for source, *zone in self.cursor.fetchall():
+            self.zones.setdefault(source, []).append(tuple(zone))
+            
+    def detecter_visages(self, gray, source, echelle=1.0, **params):
+        """Détecte les visages, uniquement dans les zones de la caméra s'il y en a
+        
+        Les coordonnées retournées sont celles de l'image complète. echelle
+        convertit les tailles min/max des zones (pixels de la caméra) vers gray.
+        """
+        zones = self.zones.get(source)
+        if not zones:
+            return self.face_cascade.detectMultiScale(gray, **params)
+        
+        hauteur_img, largeur_img = gray.shape[:2]
+        faces = []
+        for (zx, zy, zw, zh, taille_min, taille_max) in zones:
+            x0, y0 = int(zx * largeur_img), int(zy * hauteur_img)
+            x1, y1 = int((zx + zw) * largeur_img), int((zy + zh) * hauteur_img)
+            crop = gray[y0:y1, x0:x1]
+            if crop.size == 0:
+                continue
+            
+            params_zone = dict(params)
+            if taille_min:
+                params_zone['minSize'] = (int(taille_min * echelle),) * 2
+            if taille_max:
+                params_zone['maxSize'] = (int(taille_max * echelle),) * 2
+            
+            for (x, y, w, h) in self.face_cascade.detectMultiScale(crop, **params_zone):
+                faces.append((x + x0, y + y0, w, h))
+        
+        # Un visage situé dans plusieurs zones ne doit être traité qu'une fois
+        return fusionner_detections(faces) if len(zones) > 1 else faces
+        
+    def dessiner_zones(self, display_frame, source):
+        """Trace le contour des zones de détection sur l'image affichée"""
+        hauteur_img, largeur_img = display_frame.shape[:2]
+        for (zx, zy, zw, zh, _, _) in self.zones.get(source, []):
+            cv2.rectangle(display_frame, (int(zx * largeur_img), int(zy * hauteur_img)),
+                          (int((zx + zw) * largeur_img), int((zy + zh) * hauteur_img)), (200, 200, 200), 1)
+        
     def create_widgets(self):
         """Crée l'interface graphique"""
         # Notebook pour les onglets
@@ -187,6 +947,9 @@ class FaceRecognitionApp:
         btn_stop = ttk.Button(btn_frame_camera, text="⏹️ Arrêter la caméra", command=self.stop_recognition)
         btn_stop.pack(side='left', padx=5, pady=5)
         
+        btn_zones = ttk.Button(btn_frame_camera, text="🔲 Zones de détection", command=self.edit_zones)
+        btn_zones.pack(side='left', padx=5, pady=5)
+        
         # Frame pour les boutons image
         btn_frame_image = ttk.LabelFrame(frame_camera, text="Reconnaissance par Image")
         btn_frame_image.pack(pady=5, padx=10, fill='x')
@@ -246,7 +1009,9 @@ class FaceRecognitionApp:
                 
                 # Détecter les visages
                 gray = cv2.cvtColor(display_frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
+                faces = self.detecter_visages(gray, '0', echelle=min(780 / frame.shape[1], 585 / frame.shape[0]),
+                                              scaleFactor=1.3, minNeighbors=5)
+                self.dessiner_zones(display_frame, '0')
                 
                 # Dessiner des rectangles autour des visages
                 for (x, y, w, h) in faces:
@@ -300,6 +1065,173 @@ class FaceRecognitionApp:
         # Gérer la fermeture de la fenêtre
         capture_window.protocol("WM_DELETE_WINDOW", close_capture)
         
+    def edit_zones(self):
+        """Ouvre l'éditeur des zones de détection d'une caméra"""
+        zones_window = tk.Toplevel(self.root)
+        zones_window.title("Zones de détection")
+        zones_window.geometry("820x760")
+        
+        # Options : caméra et tailles de visage (pixels de la caméra)
+        options_frame = ttk.Frame(zones_window)
+        options_frame.pack(pady=5)
+        
+        ttk.Label(options_frame, text="Caméra:").pack(side='left', padx=5)
+        combo_source = ttk.Combobox(options_frame, values=('0', '1', '2'), width=5, state='readonly')
+        combo_source.set(str(self.camera_index) if self.camera_index is not None else '0')
+        combo_source.pack(side='left', padx=5)
+        
+        ttk.Label(options_frame, text="Taille min:").pack(side='left', padx=5)
+        entry_min = ttk.Entry(options_frame, width=8)
+        entry_min.pack(side='left', padx=5)
+        
+        ttk.Label(options_frame, text="Taille max:").pack(side='left', padx=5)
+        entry_max = ttk.Entry(options_frame, width=8)
+        entry_max.pack(side='left', padx=5)
+        
+        ttk.Label(zones_window, text="Clic gauche : tracer une zone  |  Clic droit : sélectionner une zone "
+                                     "(ses tailles s'affichent dans les champs ci-dessus)").pack()
+        
+        # Aperçu sur lequel les zones sont tracées à la souris
+        canvas = tk.Canvas(zones_window, width=780, height=585, bg='black')
+        canvas.pack(padx=10, pady=5)
+        
+        etat = {'source': None, 'zones': [], 'debut': None, 'rectangle': None, 'selection': None}
+        
+        def lire_taille(entry):
+            valeur = entry.get().strip()
+            return int(valeur) if valeur.isdigit() else None
+        
+        def ecrire_taille(entry, valeur):
+            entry.delete(0, tk.END)
+            if valeur:
+                entry.insert(0, str(valeur))
+        
+        def afficher_zones():
+            canvas.delete('zone')
+            for idx, (zx, zy, zw, zh, taille_min, taille_max) in enumerate(etat['zones']):
+                couleur = '#3498db' if idx == etat['selection'] else '#2ecc71'
+                canvas.create_rectangle(zx * 780, zy * 585, (zx + zw) * 780, (zy + zh) * 585,
+                                        outline=couleur, width=2, tags='zone')
+                canvas.create_text(zx * 780 + 4, zy * 585 + 4, anchor='nw', fill=couleur, tags='zone',
+                                   font=('Arial', 9, 'bold'),
+                                   text=f"min: {taille_min or '-'}  max: {taille_max or '-'}")
+        
+        def selectionner(idx):
+            etat['selection'] = idx
+            if idx is not None:
+                _, _, _, _, taille_min, taille_max = etat['zones'][idx]
+                ecrire_taille(entry_min, taille_min)
+                ecrire_taille(entry_max, taille_max)
+            afficher_zones()
+        
+        def charger_apercu(event=None):
+            source = combo_source.get()
+            etat['source'] = source
+            etat['zones'] = list(self.zones.get(source, []))
+            etat['selection'] = None
+            
+            # Réutiliser la caméra de reconnaissance si c'est la même
+            if self.is_camera_on and str(self.camera_index) == source:
+                ret, frame = self.camera.read()
+            else:
+                cap = cv2.VideoCapture(int(source))
+                ret, frame = cap.read() if cap.isOpened() else (False, None)
+                cap.release()
+            
+            canvas.delete('all')
+            if ret and frame is not None:
+                img_rgb = cv2.cvtColor(cv2.resize(frame, (780, 585)), cv2.COLOR_BGR2RGB)
+                photo = ImageTk.PhotoImage(Image.fromarray(img_rgb))
+                canvas.create_image(0, 0, image=photo, anchor='nw')
+                canvas.image = photo
+            else:
+                canvas.create_text(390, 292, text="Aperçu indisponible", fill='white', font=('Arial', 14))
+            afficher_zones()
+        
+        def debut_trace(event):
+            etat['debut'] = (event.x, event.y)
+            etat['rectangle'] = canvas.create_rectangle(event.x, event.y, event.x, event.y,
+                                                        outline='#f39c12', width=2, tags='zone')
+        
+        def trace(event):
+            if etat['debut']:
+                canvas.coords(etat['rectangle'], *etat['debut'], event.x, event.y)
+        
+        def fin_trace(event):
+            if not etat['debut']:
+                return
+            x0, y0 = etat['debut']
+            x1, y1 = min(max(event.x, 0), 780), min(max(event.y, 0), 585)
+            etat['debut'] = None
+            
+            gauche, droite = sorted((x0, x1))
+            haut, bas = sorted((y0, y1))
+            if droite - gauche > 10 and bas - haut > 10:
+                etat['zones'].append((gauche / 780, haut / 585, (droite - gauche) / 780, (bas - haut) / 585,
+                                      lire_taille(entry_min), lire_taille(entry_max)))
+                selectionner(len(etat['zones']) - 1)
+            else:
+                afficher_zones()
+        
+        def choisir_zone(event):
+            # La zone tracée en dernier est au premier plan
+            for idx in reversed(range(len(etat['zones']))):
+                zx, zy, zw, zh, _, _ = etat['zones'][idx]
+                if zx * 780 <= event.x <= (zx + zw) * 780 and zy * 585 <= event.y <= (zy + zh) * 585:
+                    selectionner(idx)
+                    return
+            selectionner(None)
+        
+        def appliquer_tailles():
+            idx = etat['selection']
+            if idx is None:
+                messagebox.showwarning("Attention", "Veuillez sélectionner une zone (clic droit)", parent=zones_window)
+                return
+            zx, zy, zw, zh, _, _ = etat['zones'][idx]
+            etat['zones'][idx] = (zx, zy, zw, zh, lire_taille(entry_min), lire_taille(entry_max))
+            afficher_zones()
+        
+        def supprimer_zone():
+            if etat['selection'] is not None:
+                del etat['zones'][etat['selection']]
+                selectionner(None)
+        
+        def effacer_zones():
+            etat['zones'] = []
+            selectionner(None)
+        
+        def enregistrer_zones():
+            source = etat['source']
+            try:
+                self.cursor.execute('DELETE FROM zones_detection WHERE source=?', (source,))
+                self.cursor.executemany('''
+                    INSERT INTO zones_detection (source, x, y, largeur, hauteur, taille_min, taille_max)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', [(source, *zone) for zone in etat['zones']])
+                self.conn.commit()
+                self.charger_zones()
+                messagebox.showinfo("Succès", f"{len(etat['zones'])} zone(s) enregistrée(s) pour la caméra {source}")
+            except Exception as e:
+                messagebox.showerror("Erreur", f"Erreur: {str(e)}")
+        
+        canvas.bind('<ButtonPress-1>', debut_trace)
+        canvas.bind('<B1-Motion>', trace)
+        canvas.bind('<ButtonRelease-1>', fin_trace)
+        canvas.bind('<ButtonPress-3>', choisir_zone)
+        combo_source.bind('<<ComboboxSelected>>', charger_apercu)
+        
+        # Boutons
+        btn_frame = ttk.Frame(zones_window)
+        btn_frame.pack(pady=10)
+        
+        ttk.Button(btn_frame, text="🔄 Actualiser l'aperçu", command=charger_apercu).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="✏️ Appliquer les tailles", command=appliquer_tailles).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="❌ Supprimer la zone", command=supprimer_zone).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="🗑️ Effacer les zones", command=effacer_zones).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="💾 Enregistrer", command=enregistrer_zones).pack(side='left', padx=5)
+        
+        charger_apercu()
+        
     def load_image(self):
         """Charge une image depuis le disque"""
         file_path = filedialog.askopenfilename(
@@ -406,41 +1338,82 @@ class FaceRecognitionApp:
         except Exception as e:
             messagebox.showerror("Erreur", f"Erreur lors de l'enregistrement: {str(e)}")
             
-    def load_known_faces(self):
-        """Charge tous les visages connus depuis la base de données et entraîne le modèle"""
-        self.cursor.execute('SELECT id, matricule, nom, prenom, face_data FROM personnes')
-        rows = self.cursor.fetchall()
+    def load_known_faces(self, arriere_plan=True):
+        """Charge tous les visages connus depuis la base de données et entraîne le modèle
+        
+        Les grandes galeries (index de candidats) sont reconstruites en
+        arrière-plan ; le modèle courant reste utilisé jusqu'au remplacement.
+        """
+        # Tout modèle reconstruit en arrière-plan avant cet appel devient obsolète
+        self.generation_modele += 1
+        
+        if arriere_plan:
+            self.cursor.execute('SELECT COUNT(*) FROM personnes')
+            if self.cursor.fetchone()[0] >= IndexCandidats.SEUIL:
+                self.lancer_reconstruction()
+                return
         
-        if len(rows) == 0:
-            self.recognizer_trained = False
-            return
+        # Entraîner le recognizer (ou l'index pour les grandes galeries)
+        nb_visages = self.modele.charger(self.cursor)
+        if self.modele.entraine:
+            print(f"✓ Modèle entraîné avec {nb_visages} visage(s)")
+            
+    def surveiller_base(self):
+        """Vérifie périodiquement si la base a été modifiée par un autre processus"""
+        # Appliquer un modèle reconstruit en arrière-plan
+        try:
+            self.appliquer_modele(self.modeles_reconstruits.get_nowait())
+        except queue.Empty:
+            pass
         
-        faces = []
-        labels = []
-        self.person_mapping = {}
+        if not self.rechargement_en_cours:
+            try:
+                version = lire_data_version(self.cursor)
+                if version != self.data_version:
+                    self.charger_zones()
+                    self.recharger_modele()
+                    self.data_version = version
+            except sqlite3.Error as e:
+                # Base verrouillée par un autre poste : réessayer au prochain passage
+                print(f"✗ Erreur lors de la lecture de la base: {e}")
+        
+        self.root.after(2000, self.surveiller_base)
+        
+    def recharger_modele(self):
+        """Applique les modifications externes de la base au modèle en mémoire"""
+        if self.modele.mettre_a_jour(self.cursor):
+            self.refresh_list()
+        else:
+            # Sinon, réentraîner en arrière-plan sans interrompre la reconnaissance
+            self.lancer_reconstruction()
+        
+    def lancer_reconstruction(self):
+        """Reconstruit le modèle dans un thread ; appliquer_modele le mettra en place"""
+        self.rechargement_en_cours = True
+        self.generation_lancee = self.generation_modele
+        threading.Thread(target=reconstruire_modele,
+                         args=('face_recognition.db', self.modeles_reconstruits, self.generation_modele),
+                         daemon=True).start()
+        
+    def appliquer_modele(self, resultat):
+        """Remplace le modèle courant par celui reconstruit en arrière-plan"""
+        # Seul le résultat du dernier thread lancé termine le rechargement en cours
+        if resultat['etiquette'] == self.generation_lancee:
+            self.rechargement_en_cours = False
+        
+        # Un rechargement local plus récent a déjà pris en compte la base
+        if resultat['etiquette'] != self.generation_modele:
+            return
+        if resultat['erreur']:
+            # Garder le modèle courant ; la prochaine vérification relancera la reconstruction
+            print(f"✗ Erreur lors du rechargement du modèle: {resultat['erreur']}")
+            self.data_version = None
+            return
         
-        for row in rows:
-            person_id, matricule, nom, prenom, face_blob = row
-            face_data = pickle.loads(face_blob)
-            
-            faces.append(face_data)
-            labels.append(person_id)
-            
-            self.person_mapping[person_id] = {
-                'matricule': matricule,
-                'nom': nom,
-                'prenom': prenom
-            }
+        self.modele.appliquer(resultat)
+        print(f"✓ Modèle rechargé avec {resultat['nb_visages']} visage(s)")
+        self.refresh_list()
         
-        # Entraîner le recognizer
-        try:
-            self.face_recognizer.train(faces, np.array(labels))
-            self.recognizer_trained = True
-            print(f"✓ Modèle entraîné avec {len(faces)} visage(s)")
-        except Exception as e:
-            print(f"✗ Erreur lors de l'entraînement: {e}")
-            self.recognizer_trained = False
-            
     def refresh_list(self):
         """Rafraîchit la liste des personnes"""
         for item in self.tree.get_children():
@@ -528,7 +1501,7 @@ class FaceRecognitionApp:
                 
     def start_recognition(self):
         """Démarre la reconnaissance faciale"""
-        if not self.recognizer_trained:
+        if not self.modele.entraine:
             messagebox.showwarning("Attention", "Aucune personne enregistrée.\nVeuillez d'abord ajouter des personnes dans l'onglet Enregistrement.")
             return
             
@@ -542,6 +1515,7 @@ class FaceRecognitionApp:
             self.camera = cv2.VideoCapture(camera_index)
             if self.camera.isOpened():
                 camera_found = True
+                self.camera_index = camera_index
                 print(f"✓ Caméra trouvée à l'indice {camera_index}")
                 break
             self.camera.release()
@@ -555,8 +1529,10 @@ class FaceRecognitionApp:
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
         self.camera.set(cv2.CAP_PROP_FPS, 30)
         
+        # Limiter le tampon du pilote pour que les images lues en veille soient récentes
+        self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
         # Attendre que la caméra s'initialise
-        import time
         time.sleep(0.5)
         
         # Tester la lecture
@@ -568,6 +1544,7 @@ class FaceRecognitionApp:
             
         self.is_camera_on = True
         self.last_recognized = {}
+        self.detecteur_mouvement = DetecteurMouvement()
         self.process_video()
         messagebox.showinfo("Succès", "Caméra démarrée avec succès!")
         
@@ -582,7 +1559,7 @@ class FaceRecognitionApp:
     
     def recognize_from_image(self):
         """Charge et reconnaît une personne depuis une image"""
-        if not self.recognizer_trained:
+        if not self.modele.entraine:
             messagebox.showwarning("Attention", "Aucune personne enregistrée.\nVeuillez d'abord ajouter des personnes dans l'onglet Enregistrement.")
             return
         
@@ -625,11 +1602,11 @@ class FaceRecognitionApp:
             
             try:
                 # Reconnaître
-                label, confidence = self.face_recognizer.predict(face_roi_resized)
+                label, confidence = self.modele.predire(face_roi_resized)
                 
                 # Plus la confiance est basse, meilleure est la correspondance
                 if confidence < 80:
-                    person_data = self.person_mapping.get(label)
+                    person_data = self.modele.person_mapping.get(label)
                     if person_data:
                         name = f"{person_data['prenom']} {person_data['nom']}"
                         recognized_count += 1
@@ -688,15 +1665,32 @@ class FaceRecognitionApp:
         """Traite le flux vidéo pour la reconnaissance"""
         if not self.is_camera_on:
             return
-            
-        ret, frame = self.camera.read()
+        
+        if self.detecteur_mouvement.est_actif():
+            ret, frame = self.camera.read()
+        else:
+            ret, frame = self.lire_image_recente()
         if ret:
             # Redimensionner pour l'affichage
             display_frame = cv2.resize(frame, (780, 585))
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
-            # Détecter les visages
-            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100))
+            # Ne lancer la détection que si la scène bouge
+            if self.detecteur_mouvement.analyser(frame):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                
+                # Détecter les visages (dans les zones de la caméra si elles sont définies)
+                faces = self.detecter_visages(gray, str(self.camera_index), scaleFactor=1.1,
+                                              minNeighbors=5, minSize=(100, 100))
+                
+                # Un visage présent maintient la détection active même sans mouvement
+                if len(faces) > 0:
+                    self.detecteur_mouvement.signaler_activite()
+            else:
+                faces = []
+                cv2.putText(display_frame, "Veille", (10, 30), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 200), 2)
+            
+            self.dessiner_zones(display_frame, str(self.camera_index))
             
             for (x, y, w, h) in faces:
                 # Extraire le visage
@@ -713,11 +1707,11 @@ class FaceRecognitionApp:
                 
                 try:
                     # Reconnaître
-                    label, confidence = self.face_recognizer.predict(face_roi_resized)
+                    label, confidence = self.modele.predire(face_roi_resized)
                     
                     # Plus la confiance est basse, meilleure est la correspondance
                     if confidence < 80:
-                        person_data = self.person_mapping.get(label)
+                        person_data = self.modele.person_mapping.get(label)
                         if person_data:
                             name = f"{person_data['prenom']} {person_data['nom']}"
                             
@@ -760,7 +1754,24 @@ class FaceRecognitionApp:
             self.label_camera.configure(image=photo, text="")
             self.label_camera.image = photo
             
-        self.root.after(30, self.process_video)
+        # Ralentir la boucle quand la scène est immobile, revenir à 30 ms dès un mouvement
+        self.root.after(self.detecteur_mouvement.prochain_delai(), self.process_video)
+        
+    def lire_image_recente(self, max_images=5):
+        """Vide le tampon de la caméra puis lit l'image courante
+        
+        En veille, les lectures sont espacées et le pilote accumule des images
+        anciennes (CAP_PROP_BUFFERSIZE n'est pas respecté par tous les pilotes).
+        Une image tamponnée est rendue immédiatement : dès qu'un grab() attend
+        le capteur, l'image obtenue est récente.
+        """
+        for _ in range(max_images):
+            debut = time.monotonic()
+            if not self.camera.grab():
+                return False, None
+            if time.monotonic() - debut > 0.015:
+                break
+        return self.camera.retrieve()
         
     def log_recognition(self, person_data):
         """Enregistre la reconnaissance dans un fichier"""
@@ -790,7 +1801,351 @@ class FaceRecognitionApp:
         if hasattr(self, 'camera') and self.camera:
             self.camera.release()
 
+class ServeurReconnaissance:
+    """Service de reconnaissance local sans interface graphique (HTTP)
+    
+    Les requêtes concurrentes sont regroupées en micro-lots traités par un seul
+    thread, afin qu'un unique modèle chargé serve plusieurs clients.
+    """
+    def __init__(self, db_path='face_recognition.db', galerie_path=None, taille_lot=8,
+                 attente_lot=0.01, taille_file=64, delai_file=0.5, delai_max=5.0):
+        # Charger le modèle de détection de visages
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        
+        # Modèle de reconnaissance partagé avec l'interface
+        self.modele = ModeleReconnaissance()
+        
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        
+        # Galerie partagée entre processus (optionnelle)
+        self.galerie = GaleriePartagee(galerie_path) if galerie_path else None
+        self.prochaine_verification = 0
+        
+        # Rechargement du modèle quand la base est modifiée
+        self.rechargement_en_cours = False
+        self.modeles_reconstruits = queue.Queue()
+        
+        # Paramètres des micro-lots et de la file d'attente
+        self.taille_lot = taille_lot
+        self.attente_lot = attente_lot
+        self.delai_file = delai_file
+        self.delai_max = delai_max
+        self.file = queue.Queue(maxsize=taille_file)
+        
+        # Statistiques de latence (en secondes)
+        # Partagées entre le thread de traitement et les threads HTTP
+        self.verrou_stats = threading.Lock()
+        self.latences = deque(maxlen=1000)
+        self.nb_traitees = 0
+        self.nb_erreurs = 0
+        self.nb_rejetees = 0
+        self.nb_expirees = 0
+        
+        self.actif = False
+        self.load_known_faces()
+        self.data_version = lire_data_version(self.cursor)
+        
+    def load_known_faces(self):
+        """Charge tous les visages connus (base ou galerie partagée) et entraîne le modèle"""
+        if self.galerie is not None:
+            # Recherche directe dans les histogrammes projetés en mémoire, sans entraînement
+            self.modele.attacher_galerie(self.galerie)
+            print(f"✓ Galerie partagée attachée ({len(self.galerie.labels)} visage(s))")
+            return
+        
+        nb_visages = self.modele.charger(self.cursor)
+        if self.modele.entraine:
+            print(f"✓ Modèle entraîné avec {nb_visages} visage(s)")
+            
+    def soumettre(self, corps, recadre=False):
+        """Place une image dans la file et attend son résultat
+        
+        Retourne un couple (code HTTP, réponse JSON).
+        """
+        mode = cv2.IMREAD_GRAYSCALE if recadre else cv2.IMREAD_COLOR
+        image = cv2.imdecode(np.frombuffer(corps, np.uint8), mode)
+        if image is None:
+            return 400, {'erreur': "Image illisible"}
+        
+        requete = {
+            'image': image,
+            'recadre': recadre,
+            'arrivee': time.perf_counter(),
+            'fait': threading.Event(),
+            'resultat': None
+        }
+        
+        # Contre-pression : refuser si la file reste pleine
+        try:
+            self.file.put(requete, timeout=self.delai_file)
+        except queue.Full:
+            with self.verrou_stats:
+                self.nb_rejetees += 1
+            return 503, {'erreur': "Service surchargé, réessayez plus tard"}
+        
+        if not requete['fait'].wait(self.delai_max) or requete['resultat'] is None:
+            with self.verrou_stats:
+                self.nb_expirees += 1
+            return 504, {'erreur': "Délai de traitement dépassé"}
+        
+        if 'erreur' in requete['resultat']:
+            return 500, requete['resultat']
+        return 200, requete['resultat']
+        
+    def boucle_lots(self):
+        """Regroupe les requêtes en micro-lots et les traite"""
+        while self.actif:
+            try:
+                premiere = self.file.get(timeout=0.5)
+            except queue.Empty:
+                self.verifier_modele()
+                continue
+            
+            # Compléter le lot avec les requêtes arrivées pendant la fenêtre d'attente
+            lot = [premiere]
+            limite = time.perf_counter() + self.attente_lot
+            while len(lot) < self.taille_lot:
+                reste = limite - time.perf_counter()
+                if reste <= 0:
+                    break
+                try:
+                    lot.append(self.file.get(timeout=reste))
+                except queue.Empty:
+                    break
+            
+            self.verifier_modele()
+            self.traiter_lot(lot)
+            
+    def verifier_modele(self):
+        """Met à jour le modèle si la galerie ou la base ont changé
+        
+        Appelé entre deux lots : le remplacement du modèle est donc atomique
+        vis-à-vis des requêtes.
+        """
+        try:
+            resultat = self.modeles_reconstruits.get_nowait()
+        except queue.Empty:
+            resultat = None
+        
+        if resultat is not None:
+            self.rechargement_en_cours = False
+            if resultat['erreur']:
+                # Garder le modèle courant et réessayer à la prochaine vérification
+                print(f"✗ Erreur lors du rechargement du modèle: {resultat['erreur']}")
+                self.data_version = None
+            else:
+                if resultat.get('galerie') is not None:
+                    self.galerie = resultat['galerie']
+                self.modele.appliquer(resultat)
+                print(f"✓ Modèle rechargé avec {resultat['nb_visages']} visage(s)")
+                if self.galerie is not None:
+                    # L'ancienne version n'est plus projetée ici : la supprimer si possible
+                    GaleriePartagee.nettoyer(self.galerie.chemin)
+        
+        if time.monotonic() < self.prochaine_verification:
+            return
+        self.prochaine_verification = time.monotonic() + 2.0
+        
+        if self.rechargement_en_cours:
+            return
+        
+        if self.galerie is not None:
+            # Remapper la galerie partagée en arrière-plan si une nouvelle version a été publiée
+            if self.galerie.a_change():
+                self.rechargement_en_cours = True
+                threading.Thread(target=rattacher_galerie,
+                                 args=(self.galerie.chemin, self.modeles_reconstruits),
+                                 daemon=True).start()
+        else:
+            try:
+                version = lire_data_version(self.cursor)
+                if version == self.data_version:
+                    return
+                # Comme dans l'interface : informations seules (ou écriture des
+                # zones) et quelques ajouts sont appliqués sans reconstruction
+                a_jour = self.modele.mettre_a_jour(self.cursor)
+            except sqlite3.Error as e:
+                print(f"✗ Erreur lors de la lecture de la base: {e}")
+                return
+            
+            self.data_version = version
+            if not a_jour:
+                self.rechargement_en_cours = True
+                threading.Thread(target=reconstruire_modele,
+                                 args=(self.db_path, self.modeles_reconstruits),
+                                 daemon=True).start()
+            
+    def traiter_lot(self, lot):
+        """Reconnaît les visages de chaque requête d'un lot"""
+        debut_lot = time.perf_counter()
+        
+        for requete in lot:
+            debut = time.perf_counter()
+            
+            # Ignorer les requêtes dont le client a déjà abandonné
+            if debut - requete['arrivee'] > self.delai_max:
+                requete['fait'].set()
+                continue
+            
+            try:
+                visages = self.reconnaitre(requete['image'], requete['recadre'])
+            except Exception as e:
+                print(f"Erreur de reconnaissance: {e}")
+                visages = None
+            
+            fin = time.perf_counter()
+            latence = fin - requete['arrivee']
+            
+            # Les échecs sont comptés à part : ils fausseraient les latences
+            if visages is None:
+                with self.verrou_stats:
+                    self.nb_erreurs += 1
+                requete['resultat'] = {'erreur': "Erreur de reconnaissance"}
+            else:
+                with self.verrou_stats:
+                    self.latences.append(latence)
+                    self.nb_traitees += 1
+                requete['resultat'] = {
+                    'visages': visages,
+                    'taille_lot': len(lot),
+                    'attente_ms': round((debut_lot - requete['arrivee']) * 1000, 2),
+                    'traitement_ms': round((fin - debut) * 1000, 2),
+                    'latence_ms': round(latence * 1000, 2)
+                }
+            requete['fait'].set()
+            
+    def reconnaitre(self, image, recadre=False):
+        """Détecte et identifie les visages d'une image
+        
+        Si recadre est vrai, l'image est considérée comme un visage déjà extrait.
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
+        if recadre:
+            faces = [(0, 0, gray.shape[1], gray.shape[0])]
+        else:
+            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(100, 100))
+        
+        resultats = []
+        for (x, y, w, h) in faces:
+            visage = {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h), 'reconnu': False}
+            
+            if self.modele.entraine:
+                face_roi = gray[y:y+h, x:x+w]
+                face_roi_resized = cv2.resize(face_roi, (200, 200))
+                label, confidence = self.modele.predire(face_roi_resized)
+                
+                # Plus la confiance est basse, meilleure est la correspondance
+                person_data = self.modele.person_mapping.get(label)
+                if confidence < 80 and person_data:
+                    visage.update(person_data)
+                    visage['reconnu'] = True
+                visage['confiance'] = int(100 - confidence)
+            
+            resultats.append(visage)
+        
+        return resultats
+        
+    def statistiques(self):
+        """Retourne les statistiques de latence du service"""
+        with self.verrou_stats:
+            latences = sorted(self.latences)
+            stats = {
+                'traitees': self.nb_traitees,
+                'erreurs': self.nb_erreurs,
+                'rejetees': self.nb_rejetees,
+                'expirees': self.nb_expirees,
+                'en_attente': self.file.qsize(),
+                'visages_connus': len(self.modele.person_mapping)
+            }
+        if latences:
+            stats['latence_moyenne_ms'] = round(sum(latences) / len(latences) * 1000, 2)
+            stats['latence_p95_ms'] = round(latences[min(len(latences) - 1, int(len(latences) * 0.95))] * 1000, 2)
+        return stats
+        
+    def demarrer(self, hote='127.0.0.1', port=8765):
+        """Démarre le serveur HTTP et le thread de traitement"""
+        self.actif = True
+        threading.Thread(target=self.boucle_lots, daemon=True).start()
+        
+        httpd = ThreadingHTTPServer((hote, port), GestionnaireRequetes)
+        httpd.service = self
+        print(f"✓ Service de reconnaissance à l'écoute sur http://{hote}:{port}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.actif = False
+            httpd.server_close()
+            self.conn.close()
+
+
+class GestionnaireRequetes(BaseHTTPRequestHandler):
+    """Gestionnaire HTTP du service de reconnaissance"""
+    taille_max = 10 * 1024 * 1024
+    
+    def do_POST(self):
+        chemin = urlparse(self.path).path
+        if chemin not in ('/reconnaitre', '/visage'):
+            self.envoyer_json(404, {'erreur': "Ressource inconnue"})
+            return
+        
+        try:
+            longueur = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.envoyer_json(400, {'erreur': "En-tête Content-Length invalide"})
+            return
+        if longueur <= 0 or longueur > self.taille_max:
+            self.envoyer_json(413 if longueur > 0 else 400, {'erreur': "Taille de l'image invalide"})
+            return
+        
+        corps = self.rfile.read(longueur)
+        code, reponse = self.server.service.soumettre(corps, recadre=(chemin == '/visage'))
+        self.envoyer_json(code, reponse)
+        
+    def do_GET(self):
+        if urlparse(self.path).path != '/stats':
+            self.envoyer_json(404, {'erreur': "Ressource inconnue"})
+            return
+        self.envoyer_json(200, self.server.service.statistiques())
+        
+    def envoyer_json(self, code, donnees):
+        """Envoie une réponse JSON"""
+        corps = json.dumps(donnees, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = FaceRecognitionApp(root)
-    root.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Application de reconnaissance faciale")
+    parser.add_argument('--serveur', action='store_true',
+                        help="Démarre le service de reconnaissance local sans interface")
+    parser.add_argument('--hote', default='127.0.0.1', help="Adresse d'écoute du service")
+    parser.add_argument('--port', type=int, default=8765, help="Port d'écoute du service")
+    parser.add_argument('--galerie', help="Fichier de galerie partagée à utiliser au lieu de la base")
+    parser.add_argument('--publier-galerie', action='store_true',
+                        help="Publie la galerie de la base dans le fichier --galerie puis quitte")
+    parser.add_argument('--benchmark-liste', action='store_true',
+                        help="Compare la recherche par liste de candidats à la recherche exhaustive")
+    parser.add_argument('--taille-galerie', type=int,
+                        help="Taille de la galerie simulée pour --benchmark-liste")
+    args = parser.parse_args()
+    
+    if args.benchmark_liste:
+        benchmark_liste(taille_galerie=args.taille_galerie)
+    elif args.publier_galerie:
+        conn = sqlite3.connect('face_recognition.db')
+        faces, labels, person_mapping = charger_galerie(conn.cursor())
+        conn.close()
+        GaleriePartagee.publier(args.galerie or 'face_recognition.galerie', faces, labels, person_mapping)
+    elif args.serveur:
+        ServeurReconnaissance(galerie_path=args.galerie).demarrer(args.hote, args.port)
+    else:
+        root = tk.Tk()
+        app = FaceRecognitionApp(root)
+        root.mainloop()